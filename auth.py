@@ -1,12 +1,40 @@
 import streamlit as st
+import contextlib
 import json
 import os
 import hashlib
+import pickle
+import sqlite3
+import threading
 import datetime
 from datetime import datetime, timedelta
 
-# File to store user data
+# SQLite database holding accounts and analysis history
+USER_DB = os.environ.get("USER_DB", "users.db")
+# Earlier versions kept users in these files; they are imported into USER_DB once
 USER_DB_FILE = "user_data.json"
+LEGACY_PKL_FILE = os.path.join("user_data", "users.pkl")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT,
+    created_at TEXT,
+    last_login TEXT
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username),
+    file_name TEXT,
+    description TEXT,
+    timestamp TEXT NOT NULL,
+    chat_id TEXT
+);
+CREATE INDEX IF NOT EXISTS history_user ON history (username, id);
+"""
+_SCHEMA_VERSION = 1
+_local = threading.local()
 
 def init_session_state():
     """Initialize the session state variables if they don't exist"""
@@ -21,56 +49,107 @@ def hash_password(password):
     """Create a simple hash of the password"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def load_users():
-    """Load users from the JSON file"""
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _legacy_users():
+    """Yield (username, record) from user_data.json, then user_data/users.pkl"""
     if os.path.exists(USER_DB_FILE):
         try:
             with open(USER_DB_FILE, 'r') as f:
-                return json.load(f)
+                yield from json.load(f).items()
         except json.JSONDecodeError:
-            # If file is corrupted, return empty dict
-            return {}
-    return {}
+            pass
+    if os.path.exists(LEGACY_PKL_FILE):
+        with open(LEGACY_PKL_FILE, 'rb') as f:
+            for username, user in pickle.load(f).items():
+                yield username, {
+                    'password': user.get('password_hash'),
+                    'email': user.get('email'),
+                    'created_at': user.get('created_at'),
+                    'last_login': user.get('last_login'),
+                    'history': [{'file_name': entry.get('file_name'),
+                                 'description': entry.get('analysis_type'),
+                                 'timestamp': entry.get('timestamp')}
+                                for entry in user.get('analysis_history', [])],
+                }
+
+def _migrate(db):
+    """Copy accounts and history from the legacy files into an empty database.
+
+    The JSON file wins when a username appears in both.
+    """
+    for username, user in _legacy_users():
+        added = db.execute(
+            "INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?)",
+            (username, user['password'], user.get('email'),
+             _isoformat(user.get('created_at')), _isoformat(user.get('last_login')))
+        ).rowcount
+        if added:
+            db.executemany(
+                "INSERT INTO history (username, file_name, description, timestamp, chat_id) VALUES (?, ?, ?, ?, ?)",
+                [(username, entry.get('file_name'), entry.get('description'),
+                  _isoformat(entry['timestamp']), entry.get('chat_id'))
+                 for entry in user.get('history', [])]
+            )
+
+@contextlib.contextmanager
+def _transaction(db):
+    """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises"""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
 
-def save_users(users):
-    """Save users to the JSON file"""
-    with open(USER_DB_FILE, 'w') as f:
-        json.dump(users, f)
+def _db():
+    """This thread's connection to USER_DB, creating and migrating it on first use.
+
+    WAL mode lets sessions read while another one writes; every write runs in
+    its own short transaction.
+    """
+    db = getattr(_local, 'db', None)
+    if db is None:
+        db = sqlite3.connect(USER_DB, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        if db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            with _transaction(db):
+                # Re-check under the write lock in case another process got here first
+                if db.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                    for statement in _SCHEMA.split(";"):
+                        if statement.strip():
+                            db.execute(statement)
+                    _migrate(db)
+                    db.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+        _local.db = db
+    return db
 
 def create_user(username, password, email):
     """Create a new user"""
-    users = load_users()
-    
-    # Check if username already exists
-    if username in users:
+    try:
+        with _transaction(_db()) as db:
+            db.execute(
+                "INSERT INTO users (username, password, email, created_at) VALUES (?, ?, ?, ?)",
+                (username, hash_password(password), email, datetime.now().isoformat())
+            )
+    except sqlite3.IntegrityError:
         return False, "Username already exists"
-    
-    # Create user record
-    users[username] = {
-        'password': hash_password(password),
-        'email': email,
-        'created_at': datetime.now().isoformat(),
-        'last_login': None,
-        'history': []
-    }
-    
-    save_users(users)
     return True, "Account created successfully"
 
 def authenticate(username, password):
     """Authenticate a user"""
-    users = load_users()
+    db = _db()
+    user = db.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
     
-    if username not in users:
-        return False, "Invalid username or password"
-    
-    hashed_password = hash_password(password)
-    if users[username]['password'] != hashed_password:
+    if user is None or user['password'] != hash_password(password):
         return False, "Invalid username or password"
     
     # Update last login
-    users[username]['last_login'] = datetime.now().isoformat()
-    save_users(users)
+    db.execute("UPDATE users SET last_login = ? WHERE username = ?", (datetime.now().isoformat(), username))
     
     return True, "Login successful"
 
@@ -85,6 +164,7 @@ def logout_user():
     st.session_state.logged_in = False
     st.session_state.username = None
     st.session_state.login_time = None
+    st.session_state.pop('history_cache', None)
 
 def get_session_duration():
     """Get the session duration in minutes"""
@@ -93,33 +173,29 @@ def get_session_duration():
         return round(delta.total_seconds() / 60)
     return 0
 
-def record_analysis(username, file_name, description):
+def record_analysis(username, file_name, description, chat_id=None):
     """Record an analysis in the user's history"""
-   
-    
-    users = load_users()
-    
-    if username in users:
-        # Add the analysis to the user's history
-        users[username]['history'].append({
-            'file_name': file_name,
-            'description': description,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        save_users(users)
-
-def get_user_history(username):
-    """Get the analysis history for a user"""
-    
-    
-    users = load_users()
-    
-    if username in users and 'history' in users[username]:
-        # Convert ISO timestamps to datetime objects
-        history = users[username]['history']
-        for entry in history:
-            entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
-        return history
-    
-    return []
\ No newline at end of file
+    # chat_id lets the stored parse be reopened later without the original file
+    _db().execute(
+        "INSERT INTO history (username, file_name, description, timestamp, chat_id) "
+        "SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE username = ?)",
+        (username, file_name, description, datetime.now().isoformat(), chat_id, username)
+    )
+    st.session_state.pop('history_cache', None)
+
+def get_user_history(username, limit=None, offset=0):
+    """Get the analysis history for a user, newest first.
+
+    limit and offset select one page. Results are kept in the session until
+    record_analysis adds an entry, so reruns don't query the database again.
+    """
+    cache = st.session_state.setdefault('history_cache', {})
+    key = (username, limit, offset)
+    if key not in cache:
+        rows = _db().execute(
+            "SELECT file_name, description, timestamp, chat_id FROM history "
+            "WHERE username = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (username, -1 if limit is None else limit, offset)
+        )
+        cache[key] = [dict(row, timestamp=datetime.fromisoformat(row['timestamp'])) for row in rows]
+    return cache[key]
\ No newline at end of file
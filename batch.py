@@ -0,0 +1,101 @@
+"""Analyze a directory of WhatsApp exports without Streamlit.
+
+Usage: python batch.py INPUT_DIR OUTPUT_DIR [--workers N] [--date-format mm-dd-yy]
+                       [--link-mode fast] [--no-pdf] [--no-charts] [--skip-existing]
+
+Every INPUT_DIR/*.txt export gets <name>.json with the chat statistics,
+<name>.csv with per-user counts and, unless --no-pdf is given,
+<name>.pdf with the same report the dashboard offers for Everyone.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Charts are drawn off-screen
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import charts
+import chat_cache
+import cube
+import functions
+import report
+
+
+def analyze_file(path, out_dir, dayfirst=True, link_mode=None, pdf=True, pdf_charts=True):
+    """Parse one export and write its JSON, CSV and optional PDF outputs"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    stem = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+
+    df = functions.PreProcess(functions.generateDataFrame(io.BytesIO(data)), dayfirst)
+    chat = cube.buildCube(df, link_mode=link_mode)
+    view = cube.userView(chat, 'Everyone')
+    _, media_cnt, deleted_msgs_cnt, links_cnt, word_count, msg_count = functions.getStats(view)
+
+    per_user = chat['cells'].groupby('User', observed=True)[cube.MEASURES].sum()
+    per_user = per_user.drop(index='Notifications', errors='ignore').sort_values('messages', ascending=False)
+    per_user.to_csv(f"{stem}.csv")
+
+    stats = {
+        'file': os.path.basename(path),
+        'chat_id': chat_cache.chat_id(data),
+        'messages': msg_count,
+        'words': word_count,
+        'media': media_cnt,
+        'links': links_cnt,
+        'deleted': deleted_msgs_cnt,
+        'users': {user: int(n) for user, n in per_user['messages'].items()},
+        'top_emojis': view['emojis'].most_common(10),
+        'top_words': view['words'].most_common(20),
+    }
+    with open(f"{stem}.json", 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    if pdf:
+        images = {}
+        if pdf_charts:
+            images = {name: charts.render(name, view) for name in charts.dashboard_charts(view, 'Everyone')}
+        report.write_report(report.report_data(view, 'Everyone'), f"{stem}.pdf", images)
+    return stem
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports in bulk")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--date-format', choices=['dd-mm-yy', 'mm-dd-yy'], default='dd-mm-yy')
+    parser.add_argument('--link-mode', choices=['exact', 'fast'], default=None)
+    parser.add_argument('--no-pdf', action='store_true')
+    parser.add_argument('--no-charts', action='store_true', help="leave charts out of the PDF reports")
+    parser.add_argument('--skip-existing', action='store_true',
+                        help="skip exports whose JSON output already exists")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = sorted(glob.glob(os.path.join(args.input_dir, '*.txt')))
+    if args.skip_existing:
+        paths = [p for p in paths if not os.path.exists(
+            os.path.join(args.output_dir, os.path.splitext(os.path.basename(p))[0] + '.json'))]
+
+    options = dict(dayfirst=args.date_format == 'dd-mm-yy', link_mode=args.link_mode, pdf=not args.no_pdf,
+                   pdf_charts=not args.no_charts)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(analyze_file, path, args.output_dir, **options): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                print(f"done {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"failed {futures[future]}: {e}", file=sys.stderr)
+    print(f"{len(paths) - failed} of {len(paths)} exports analyzed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
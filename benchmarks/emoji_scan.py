@@ -0,0 +1,71 @@
+"""Compare emoji counting throughput against the original per-character scan.
+
+Usage: python benchmarks/emoji_scan.py [--messages 200000] [--punctuation] [--repeat 3]
+                                       [--data-dir DIR]
+
+The original getEmoji tested every character of every message against
+emoji.EMOJI_DATA. countEmojis skips ASCII-only messages, marks the code
+points of the others that can be part of an emoji in one lookup table, and
+splits each run of marked code points into emoji with one dict lookup per
+run in the common case. --punctuation appends typographic quotes, an
+ellipsis and a currency sign to every message, which sit close to emoji
+blocks in Unicode but are never marked, so they must not slow the scan down.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import functions
+from stages import export_path
+
+PUNCTUATION = " ’quoted’ “so” … ₹500"
+
+
+def per_character(messages):
+    """The original getEmoji loop"""
+    import emoji
+    emojis = []
+    for message in messages:
+        emojis.extend([c for c in message if c in emoji.EMOJI_DATA])
+    return Counter(emojis)
+
+
+def best_seconds(fn, messages, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(messages)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark emoji counting")
+    parser.add_argument('--messages', type=int, default=200_000)
+    parser.add_argument('--punctuation', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=os.path.join(HERE, 'data'))
+    args = parser.parse_args(argv)
+
+    with open(export_path(args.data_dir, args.messages, '12h-dmy'), 'rb') as f:
+        messages = functions.generateDataFrame(f)['Message']
+    if args.punctuation:
+        messages = messages + PUNCTUATION
+    megabytes = messages.str.len().sum() / 1e6
+
+    # Warm up the emoji data and build the code-point table
+    functions.countEmojis(messages.head(100))
+    for name, fn in (('per-character', per_character), ('countEmojis', functions.countEmojis)):
+        seconds = best_seconds(fn, messages, args.repeat)
+        print(f"{name:<14} {seconds:7.3f} s  {len(messages) / seconds / 1e6:6.2f} M msg/s  "
+              f"{megabytes / seconds:7.1f} M chars/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Check the cold-start import cost of the app modules against a budget.
+
+Usage: python benchmarks/import_time.py [--budget-ms N] [--runs N]
+
+Each measurement imports a module in a fresh interpreter and reports the
+time on top of its unavoidable base (pandas for the analysis modules,
+streamlit for the app's startup imports), taking the best of several runs.
+It also fails if any of the lazily imported libraries is loaded at startup.
+Exits non-zero when a module is over budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, base imports, imports under test)
+CASES = [
+    ('functions', 'pandas', 'functions'),
+    ('cube', 'pandas', 'cube'),
+    ('chat_cache', 'pandas', 'chat_cache'),
+    ('batch worker', 'pandas', 'batch'),
+    ('main.py startup', 'streamlit', 'functions, auth, charts, chat_cache, chat_store, cube, report, search'),
+]
+# Only loaded by the code paths that need them
+LAZY = ['matplotlib.pyplot', 'seaborn', 'wordcloud', 'reportlab', 'urlextract', 'emoji']
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "100"))
+
+_PROBE = """
+import sys, time
+import {base}
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def measure(base, modules, runs):
+    """Best-of-runs import time in ms and the lazy modules that got loaded"""
+    best, loaded = float('inf'), ''
+    code = _PROBE.format(base=base, modules=modules, lazy=LAZY)
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout.split()
+        best = min(best, float(out[0]) * 1000)
+        loaded = out[1] if len(out) > 1 else ''
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, base, modules in CASES:
+        ms, loaded = measure(base, modules, args.runs)
+        ok = ms <= args.budget_ms and not loaded
+        failed |= not ok
+        note = f"  eagerly loads {loaded}" if loaded else ""
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<16} {ms:7.1f} ms over {base}{note}")
+    print(f"budget: {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
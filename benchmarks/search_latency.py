@@ -0,0 +1,59 @@
+"""Time building the search index and answering queries on a synthetic export.
+
+Usage: python benchmarks/search_latency.py [--messages 1000000] [--repeat 20]
+                                           [--data-dir DIR]
+
+The export is generated once into --data-dir (see synthetic_export.py) and
+reused. Every query runs once unfiltered and once restricted to a user and a
+date range; the best of --repeat runs is reported in milliseconds.
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import functions
+import search
+from stages import export_path
+
+QUERIES = ['exam', 'exam notes', '"meeting tomorrow"', 'meet*', '"send please" th*']
+
+
+def best_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(min(times) * 1000, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inverted-index message search")
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--data-dir', default=os.path.join(HERE, 'data'))
+    args = parser.parse_args(argv)
+
+    with open(export_path(args.data_dir, args.messages, '12h-dmy'), 'rb') as f:
+        df = functions.PreProcess(functions.generateDataFrame(f), True)
+    start = time.perf_counter()
+    index = search.buildIndex(df)
+    print(f"buildIndex: {time.perf_counter() - start:.2f}s for {len(df)} messages, "
+          f"{len(index['rows'])} postings, {len(index['vocab'])} terms")
+
+    user = index['user_names'][0]
+    since, until = df['timestamp'].iloc[len(df) // 4], df['timestamp'].iloc[len(df) // 2]
+    for query in QUERIES:
+        hits = len(search.search(index, query))
+        plain = best_ms(lambda: search.search(index, query), args.repeat)
+        filtered = best_ms(lambda: search.search(index, query, user, since, until), args.repeat)
+        print(f"{query:<22} {hits:>9} hits  {plain:>8} ms  filtered {filtered:>8} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
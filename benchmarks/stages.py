@@ -0,0 +1,166 @@
+"""Time and memory-profile each stage of the analysis pipeline.
+
+Usage: python benchmarks/stages.py [--sizes 10000 100000] [--formats 12h-dmy 24h-mdy]
+                                   [--baseline PATH] [--save-baseline] [--tolerance 0.25]
+                                   [--link-mode exact|fast] [--no-memory]
+
+Synthetic exports (see synthetic_export.py) are generated once per size and
+format into --data-dir and reused. Every stage is timed in a plain pass and,
+unless --no-memory is given, run again under tracemalloc for its peak
+allocation. getStats, getEmoji and MostCommonWords are given the
+preprocessed frame, so each pays for its own analyzeChat pass; the later
+stages read the cube built by buildCube.
+
+With --save-baseline the results are written to --baseline; otherwise they
+are compared against it and the run fails when a stage is slower or bigger
+than the baseline by more than the tolerance, or when the baseline is
+missing or lacks one of the cases run. Baselines are only meaningful on the
+machine that recorded them.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import pandas as pd
+
+import cube
+import functions
+import report
+import synthetic_export
+
+STAGES = ['generateDataFrame', 'PreProcess', 'buildCube', 'getStats', 'getEmoji',
+          'MostCommonWords', 'activity_heatmap', 'create_wordcloud', 'pdf_report']
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.05
+MIN_MB = 1.0
+
+
+def export_path(data_dir, size, fmt):
+    """Generate the synthetic export for a size and format unless it exists"""
+    clock, order = fmt.split('-')
+    path = os.path.join(data_dir, f"chat_{size}_{fmt}.txt")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as out:
+            synthetic_export.generate(out, size, clock=clock, order=order)
+        os.replace(f"{path}.tmp", path)
+    return path
+
+
+def pipeline(path, dayfirst, link_mode=None):
+    """Yield (stage, thunk) pairs; each thunk runs one stage on the previous results"""
+    state = {}
+
+    def parse():
+        with open(path, 'rb') as f:
+            state['raw'] = functions.generateDataFrame(f)
+
+    def preprocess():
+        state['df'] = functions.PreProcess(state['raw'], dayfirst)
+
+    def build():
+        state['view'] = cube.userView(cube.buildCube(state['df'], link_mode=link_mode), 'Everyone')
+
+    yield 'generateDataFrame', parse
+    yield 'PreProcess', preprocess
+    yield 'buildCube', build
+    yield 'getStats', lambda: functions.getStats(functions.analyzeChat(state['df'], link_mode=link_mode))
+    yield 'getEmoji', lambda: functions.getEmoji(functions.analyzeChat(state['df'], link_mode=link_mode))
+    yield 'MostCommonWords', lambda: functions.MostCommonWords(functions.analyzeChat(state['df'], link_mode=link_mode))
+    yield 'activity_heatmap', lambda: functions.activity_heatmap(state['view']['df'])
+    yield 'create_wordcloud', lambda: functions.create_wordcloud(state['view'])
+    yield 'pdf_report', lambda: report.write_report(report.report_data(state['view'], 'Everyone'), io.BytesIO())
+
+
+def run_case(path, dayfirst, link_mode=None, memory=True):
+    """{stage: {'seconds': ..., 'peak_mb': ...}} for one export"""
+    results = {}
+    for stage, thunk in pipeline(path, dayfirst, link_mode):
+        gc.collect()
+        start = time.perf_counter()
+        thunk()
+        results[stage] = {'seconds': round(time.perf_counter() - start, 4)}
+    if memory:
+        for stage, thunk in pipeline(path, dayfirst, link_mode):
+            gc.collect()
+            tracemalloc.start()
+            thunk()
+            results[stage]['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            tracemalloc.stop()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every stage that regressed against the baseline"""
+    regressions = []
+    for case, stages in results.items():
+        for stage, now in stages.items():
+            before = baseline.get(case, {}).get(stage)
+            if not before:
+                regressions.append(f"{case} {stage}: not in the baseline")
+                continue
+            for metric, floor in (('seconds', MIN_SECONDS), ('peak_mb', MIN_MB)):
+                if metric in now and metric in before:
+                    limit = max(before[metric] * (1 + tolerance), before[metric] + floor)
+                    if now[metric] > limit:
+                        regressions.append(f"{case} {stage}: {metric} {now[metric]} > {before[metric]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chat analysis pipeline stage by stage")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--formats', nargs='+', default=['12h-dmy', '24h-mdy'],
+                        choices=['12h-dmy', '12h-mdy', '24h-dmy', '24h-mdy'])
+    parser.add_argument('--data-dir', default=os.path.join(HERE, 'data'))
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--link-mode', choices=['exact', 'fast'], default=None)
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args(argv)
+
+    # Warm up lazy imports, fonts and regex caches so the first case isn't charged for them
+    for _, thunk in pipeline(export_path(args.data_dir, 1000, '12h-dmy'), True, args.link_mode):
+        thunk()
+
+    results = {}
+    for size in args.sizes:
+        for fmt in args.formats:
+            path = export_path(args.data_dir, size, fmt)
+            case = f"{size}-{fmt}" + (f"-{args.link_mode}" if args.link_mode else "")
+            results[case] = run_case(path, fmt.endswith('dmy'), args.link_mode, memory=not args.no_memory)
+
+    table = pd.DataFrame({(case, metric): {stage: values.get(metric) for stage, values in stages.items()}
+                          for case, stages in results.items() for metric in ('seconds', 'peak_mb')})
+    print(table.reindex(STAGES).to_string())
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                       'pandas': pd.__version__, 'results': results}, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; record one with --save-baseline")
+        return 1
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f)['results'], args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
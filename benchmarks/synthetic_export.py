@@ -0,0 +1,116 @@
+"""Generate synthetic WhatsApp chat exports for benchmarking.
+
+Usage: python benchmarks/synthetic_export.py OUT.txt [--messages N] [--users N]
+                                             [--clock 12h|24h] [--order dmy|mdy] [--seed N]
+
+Messages are in chronological order and mix plain text, multi-line messages,
+media and deleted markers, emoji (skin tones, ZWJ sequences, flags,
+keycaps), URLs and group notifications in roughly the proportions seen in
+real group chats.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "hello hi kya hai bhai ok okay yes no haan nahi acha theek meeting tomorrow today "
+    "lol haha class exam notes send please thanks bro yaar kal aaj kaha ho gaya "
+    "the a is are to of and in for on with this that what where when why how "
+    "project report deadline submit done call later sure maybe weekend party"
+).split()
+EMOJI = ["😂", "❤️", "👍", "👍🏽", "🙏", "😊", "🔥", "😭", "🎉", "🇮🇳", "👨‍👩‍👧", "🤦🏻‍♂️", "1️⃣", "✅"]
+URLS = [
+    "https://example.com/a?b=1", "http://news.example.org/story/42", "www.google.com",
+    "youtu.be/dQw4w9WgXcQ", "https://docs.python.org/3/", "github.com/user/repo", "example.in",
+]
+NAMES = ["Aarav", "Priya", "Rahul Sharma", "Sneha", "Vikram", "Ananya", "Rohan K", "Meera",
+         "Arjun", "Kavya", "Ishaan", "Diya", "Kabir", "Saanvi", "Aditya", "Nisha"]
+MEDIA_MESSAGE = "<Media omitted>"
+DELETED_MESSAGE = "This message was deleted"
+
+
+def user_names(count, rng):
+    """count distinct senders: names, names with emoji and bare phone numbers"""
+    users = []
+    for i in range(count):
+        base = NAMES[i % len(NAMES)] + ("" if i < len(NAMES) else f" {i // len(NAMES)}")
+        if i % 7 == 3:
+            base += " " + rng.choice(EMOJI[:6])
+        if i % 5 == 4:
+            base = f"+91 9{rng.randrange(10**8, 10**9):09d}"[:16]
+        users.append(base)
+    return users
+
+
+def _body(rng):
+    r = rng.random()
+    if r < 0.07:
+        return MEDIA_MESSAGE
+    if r < 0.09:
+        return DELETED_MESSAGE
+    tokens = rng.choices(WORDS, k=rng.randint(1, 14))
+    if rng.random() < 0.3:
+        tokens += rng.choices(EMOJI, k=rng.randint(1, 3))
+    if rng.random() < 0.08:
+        tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(URLS))
+    rng.shuffle(tokens)
+    text = " ".join(tokens)
+    if rng.random() < 0.05:
+        text += "\n" + " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))
+    return text
+
+
+def _stamp(when, clock, order):
+    date = f"{when.day}/{when.month}/{when:%y}" if order == 'dmy' else f"{when.month}/{when.day}/{when:%y}"
+    if clock == '12h':
+        time = f"{when.hour % 12 or 12}:{when:%M} {'AM' if when.hour < 12 else 'PM'}"
+    else:
+        time = f"{when:%H:%M}"
+    return f"{date}, {time} - "
+
+
+def generate(out, messages, users=8, clock='12h', order='dmy', seed=0,
+             start=datetime(2021, 1, 1), pool=4096):
+    """Write a chat of `messages` lines to the text stream out.
+
+    Message bodies are drawn from a pool of `pool` random bodies so that
+    millions of lines can be written quickly while the vocabulary, emoji
+    and URL mix stays the same at every size.
+    """
+    rng = random.Random(seed)
+    senders = user_names(users, rng)
+    bodies = [_body(rng) for _ in range(pool)]
+    # Busy chats post every few seconds, quiet ones every few hours
+    step = max(1, int(3 * 365 * 24 * 3600 / max(messages, 1)))
+    when = start
+    out.write(_stamp(when, clock, order) + "Messages and calls are end-to-end encrypted. "
+              "No one outside of this chat, not even WhatsApp, can read or listen to them.\n")
+    lines = []
+    for i in range(messages):
+        when += timedelta(seconds=rng.randint(1, 2 * step))
+        stamp = _stamp(when, clock, order)
+        if rng.random() < 0.005:
+            lines.append(f"{stamp}{rng.choice(senders)} added {rng.choice(senders)}\n")
+        else:
+            lines.append(f"{stamp}{rng.choice(senders)}: {rng.choice(bodies)}\n")
+        if len(lines) == 10000:
+            out.write("".join(lines))
+            lines.clear()
+    out.write("".join(lines))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic WhatsApp chat export")
+    parser.add_argument('out')
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--clock', choices=['12h', '24h'], default='12h')
+    parser.add_argument('--order', choices=['dmy', 'mdy'], default='dmy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    with open(args.out, 'w', encoding='utf-8') as out:
+        generate(out, args.messages, args.users, args.clock, args.order, args.seed)
+
+
+if __name__ == '__main__':
+    main()
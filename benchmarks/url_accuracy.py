@@ -0,0 +1,44 @@
+"""Compare 'fast' link counting against urlextract on real chat exports.
+
+Usage: python benchmarks/url_accuracy.py CHAT.txt [CHAT.txt ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import functions
+
+
+def compare(messages):
+    """Per-message exact and fast link counts plus timings for each mode"""
+    counts = {}
+    timings = {}
+    for mode in ('exact', 'fast'):
+        start = time.perf_counter()
+        functions.countLinks(messages, mode)
+        timings[mode] = time.perf_counter() - start
+        counts[mode] = messages.map(lambda m: functions.countLinks(pd.Series([m]), mode))
+    return pd.DataFrame(counts), timings
+
+
+def main(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            df = functions.generateDataFrame(f)
+        messages = df.loc[df['User'] != 'Notifications', 'Message']
+        counts, timings = compare(messages)
+        differ = counts['exact'] != counts['fast']
+        print(path)
+        print(f"  messages: {len(messages)}  links exact: {counts['exact'].sum()}  fast: {counts['fast'].sum()}")
+        print(f"  messages that agree: {100 * (1 - differ.mean()):.3f}%")
+        print(f"  time exact: {timings['exact']:.3f}s  fast: {timings['fast']:.3f}s")
+        for message in messages[differ].head(10):
+            print(f"    differs: {message[:100]!r}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
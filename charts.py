@@ -0,0 +1,231 @@
+"""Render dashboard charts to image bytes and cache them.
+
+Figures are built with matplotlib's object-oriented Figure API, never through
+pyplot, so nothing is registered globally: once a figure has been saved to
+bytes it is cleared and left for garbage collection. That also makes it safe
+to render several charts at once on a thread pool.
+"""
+import contextvars
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import functions
+import metrics
+
+CHART_CACHE_MAX_MB = int(os.environ.get("CHART_CACHE_MAX_MB", "64"))
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", "4"))
+# Word cloud layouts kept per (chat, user) so redrawing one skips the placement
+WORDCLOUD_LAYOUTS = int(os.environ.get("WORDCLOUD_LAYOUTS", "32"))
+# Same output st.pyplot produces for a figure
+SAVE_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+
+
+def _figure(**kwargs):
+    from matplotlib.figure import Figure
+    fig = Figure(**kwargs)
+    return fig, fig.subplots()
+
+
+def _palette(name, n):
+    import seaborn as sns
+    return sns.color_palette(name, n)
+
+
+def users_bar(view):
+    user_counts = functions.messageCounts(view['df'], 'User').sort_values(ascending=False)
+    fig, ax = _figure()
+    ax.bar(user_counts.index, user_counts.values, color=_palette("viridis", len(user_counts)))
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.set_ylabel("Number of Messages")
+    return fig
+
+
+def users_pie(view):
+    user_counts = functions.messageCounts(view['df'], 'User').sort_values(ascending=False)
+    fig, ax = _figure()
+    ax.pie(user_counts.values, labels=user_counts.index, autopct='%1.1f%%', startangle=90,
+           colors=_palette("viridis", len(user_counts)))
+    ax.axis('equal')
+    return fig
+
+
+def emoji_bar(view):
+    top_emojis = functions.getEmoji(view).head(10)
+    fig, ax = _figure()
+    ax.bar(top_emojis[0], top_emojis[1], color=_palette("YlOrRd", len(top_emojis)))
+    ax.tick_params(axis='x', labelrotation=90)
+    return fig
+
+
+def emoji_pie(view):
+    top_emojis = functions.getEmoji(view).head(8)
+    fig, ax = _figure()
+    ax.pie(top_emojis[1], labels=top_emojis[0], autopct='%1.1f%%', startangle=90,
+           colors=_palette("YlOrRd", len(top_emojis)))
+    ax.axis('equal')
+    return fig
+
+
+def words_bar(view):
+    top_words = functions.MostCommonWords(view).head(10)
+    fig, ax = _figure()
+    y_pos = np.arange(len(top_words))
+    ax.barh(y_pos, top_words[1], align='center', color=_palette("Blues_r", len(top_words)))
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(top_words[0])
+    ax.invert_yaxis()
+    ax.set_xlabel('Frequency')
+    return fig
+
+
+def wordcloud(view):
+    fig, ax = _figure()
+    layout = view.get('wordcloud') or functions.create_wordcloud(view)
+    ax.imshow(layout, interpolation='bilinear')
+    ax.axis('off')
+    return fig
+
+
+def heatmap(view):
+    import seaborn as sns
+    fig, ax = _figure(figsize=(12, 8))
+    sns.heatmap(functions.activity_heatmap(view['df']), cmap="YlGnBu", ax=ax)
+    ax.set_title('Activity Heat Map')
+    ax.set_xlabel('Hour of Day')
+    ax.set_ylabel('Day of Week')
+    return fig
+
+
+# Chart name -> builder taking a cube.userView result and returning a Figure
+CHARTS = {
+    'users_bar': users_bar,
+    'users_pie': users_pie,
+    'emoji_bar': emoji_bar,
+    'emoji_pie': emoji_pie,
+    'words_bar': words_bar,
+    'wordcloud': wordcloud,
+    'week': lambda view: functions.WeekAct(view['df']),
+    'month': lambda view: functions.MonthAct(view['df']),
+    'timeline': lambda view: functions.dailytimeline(view['df']),
+    'heatmap': heatmap,
+}
+
+
+def dashboard_charts(view, user):
+    """Names of the charts the dashboard shows for this user's view"""
+    names = []
+    if user == 'Everyone':
+        names += ['users_bar', 'users_pie']
+    if view['emojis']:
+        names += ['emoji_bar', 'emoji_pie']
+    if view['words']:
+        names += ['words_bar', 'wordcloud']
+    return names + ['week', 'month', 'timeline', 'heatmap']
+
+
+def render(name, view, fmt='png'):
+    """Build one chart and return it encoded as PNG or SVG bytes"""
+    fig = CHARTS[name](view)
+    try:
+        image = io.BytesIO()
+        fig.savefig(image, format=fmt, **SAVE_OPTIONS)
+        return image.getvalue()
+    finally:
+        fig.clear()
+
+
+class ChartCache:
+    """Bounded LRU cache of rendered charts.
+
+    Keys are (chat key, user, chart name, format), where the chat key is
+    whatever identifies the aggregated chat, e.g. (chat_id, dayfirst).
+    """
+
+    def __init__(self, max_bytes=CHART_CACHE_MAX_MB << 20, workers=CHART_WORKERS):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="charts")
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            if len(image) > self.max_bytes:
+                return
+            self._entries[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._layouts.clear()
+
+    def wordcloud_layout(self, chat_key, user, view):
+        """The WordCloud for a chat and user, laid out once and then reused"""
+        key = (chat_key, user)
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+        layout = functions.create_wordcloud(view)
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > WORDCLOUD_LAYOUTS:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def render_all(self, chat_key, user, view, names, fmt='png'):
+        """Return {name: image bytes}, rendering cache misses concurrently.
+
+        A chart that fails to render maps to its exception instead, and is
+        tried again on the next call.
+        """
+        images = {}
+        pending = {}
+        with metrics.stage('charts') as record:
+            for name in names:
+                key = (chat_key, user, name, fmt)
+                images[name] = self.get(key)
+                if images[name] is None:
+                    # Carry the caller's metrics recorder into the pool thread
+                    render = contextvars.copy_context().run
+                    pending[name] = (key, self._pool.submit(render, self._render, chat_key, user, name, view, fmt))
+            # Rows here are the charts actually drawn; cache hits are free
+            record['rows'] = len(pending)
+            for name, (key, future) in pending.items():
+                try:
+                    images[name] = future.result()
+                except Exception as e:
+                    images[name] = e
+                else:
+                    self.put(key, images[name])
+        return images
+
+    def _render(self, chat_key, user, name, view, fmt):
+        if name == 'wordcloud':
+            view = dict(view, wordcloud=self.wordcloud_layout(chat_key, user, view))
+        return render(name, view, fmt)
+
+
+# Shared by every Streamlit session in this process
+cache = ChartCache()
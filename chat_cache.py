@@ -0,0 +1,263 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import chat_store
+import cube
+import functions
+import search
+
+# On-disk tier backed by chat_store; set CHAT_CACHE_DIR="" to keep parsed
+# chats in memory only
+CACHE_DIR = os.environ.get("CHAT_CACHE_DIR", chat_store.STORE_DIR)
+CACHE_MAX_MB = int(os.environ.get("CHAT_CACHE_MAX_MB", "512"))
+# Size cap of the on-disk tier; least recently used chats are deleted past it
+STORE_MAX_MB = int(os.environ.get("CHAT_STORE_MAX_MB", "1024"))
+# Bytes hashed to shortlist stored chats that a new export may extend
+HEAD_BYTES = 4096
+# Two exports are of the same conversation when they share this many
+# consecutive messages; a text forwarded to several groups never does
+OVERLAP_RUN = 20
+
+
+def chat_id(data):
+    """Content hash identifying an uploaded chat export"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _longest_run(mask):
+    """Length of the longest stretch of True in a bool array"""
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    return int((edges[1::2] - edges[::2]).max()) if len(edges) else 0
+
+
+class ChatCache:
+    """Bounded LRU cache of parsed chats keyed by content hash and date format.
+
+    Entries are keyed by (chat_id, dayfirst); dayfirst=None holds the raw
+    generateDataFrame output, True/False the PreProcess output for that date
+    format. Callers get shallow copies, so adding or dropping columns and rows
+    on the result never touches the cached frame.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_MB << 20, cache_dir=CACHE_DIR, store_max_bytes=STORE_MAX_MB << 20):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.store_max_bytes = store_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a cached frame or None, checking memory before disk"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0].copy(deep=False)
+        if self.cache_dir:
+            df = chat_store.load_chat(*key, store_dir=self.cache_dir)
+            if df is not None:
+                self._remember(key, df)
+                return df.copy(deep=False)
+        return None
+
+    def put(self, key, df):
+        """Store a frame, writing it through to disk when a cache dir is set"""
+        self._write(key, df)
+        if self.cache_dir:
+            self._prune(key[0])
+
+    def _write(self, key, df):
+        if self.cache_dir:
+            chat_store.save_chat(key[0], df, key[1], store_dir=self.cache_dir)
+        self._remember(key, df)
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (df, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def load(self, cid, file, dayfirst=None):
+        """Return the parsed chat, reading and parsing the file only on a miss.
+
+        file may be None for a chat reopened from the store. With
+        dayfirst=None this is the generateDataFrame output; otherwise the
+        PreProcess output for that date format, built from the cached parse.
+        """
+        key = (cid, dayfirst)
+        df = self.get(key)
+        if df is not None:
+            return df
+        if dayfirst is None:
+            if file is None:
+                raise FileNotFoundError("No stored copy of this chat, please upload it again")
+            file.seek(0)
+            data = file.read()
+            df = self._extend(cid, data)
+            if df is not None:
+                return df.copy(deep=False)
+            df = functions.generateDataFrame(io.BytesIO(data))
+            self._record(cid, data)
+        else:
+            df = functions.PreProcess(self.load(cid, file), dayfirst)
+        self.put(key, df)
+        return df.copy(deep=False)
+
+    def load_cube(self, cid, file, dayfirst):
+        """The aggregate cube of a chat, built once and then kept in the store"""
+        if self.cache_dir:
+            stored = chat_store.load_cube(cid, dayfirst, store_dir=self.cache_dir)
+            if stored is not None:
+                return stored
+        chat_cube = cube.buildCube(self.load(cid, file, dayfirst))
+        if self.cache_dir:
+            chat_store.save_cube(cid, chat_cube, dayfirst, store_dir=self.cache_dir)
+            self._prune(cid)
+        return chat_cube
+
+    def load_keys(self, cid, file, dayfirst):
+        """The functions.messageKeys fingerprints of a chat, kept in the store like its cube"""
+        if self.cache_dir:
+            stored = chat_store.load_keys(cid, dayfirst, store_dir=self.cache_dir)
+            if stored is not None:
+                return stored
+        keys = functions.messageKeys(self.load(cid, file, dayfirst))
+        if self.cache_dir:
+            chat_store.save_keys(cid, keys, dayfirst, store_dir=self.cache_dir)
+            self._prune(cid)
+        return keys
+
+    def load_index(self, cid, file, dayfirst):
+        """The search.buildIndex index of a chat, built on first search and then kept in the store"""
+        if self.cache_dir:
+            stored = chat_store.load_index(cid, dayfirst, store_dir=self.cache_dir)
+            if stored is not None:
+                return stored
+        index = search.buildIndex(self.load(cid, file, dayfirst))
+        if self.cache_dir:
+            chat_store.save_index(cid, index, dayfirst, store_dir=self.cache_dir)
+            self._prune(cid)
+        return index
+
+    def combine(self, chats, dayfirst):
+        """One cube over several chats, counting a message shared by overlapping exports once.
+
+        chats maps chat ids to their files (or None when stored). Two chats
+        are exports of the same conversation when they share a run of
+        OVERLAP_RUN consecutive messages (or all of a shorter chat); only
+        then are the messages they share dropped from one of them, so a text
+        someone sent to several groups still counts in each. Chats are taken
+        largest first: one whose messages were all seen already, such as an
+        older export of the same group, is skipped, and one with nothing
+        seen already contributes its stored cube unchanged. Only a chat that
+        partly overlaps the others has its new messages aggregated again.
+        Returns the merged cube and the number of duplicates dropped.
+        """
+        keys = {cid: self.load_keys(cid, file, dayfirst) for cid, file in chats.items()}
+        taken = []
+        cubes = []
+        duplicates = 0
+        for cid in sorted(keys, key=lambda cid: len(keys[cid]), reverse=True):
+            dup = np.zeros(len(keys[cid]), dtype=bool)
+            for other in taken:
+                shared = np.isin(keys[cid], keys[other])
+                if _longest_run(shared) >= min(OVERLAP_RUN, len(shared)):
+                    dup |= shared
+            n_dup = int(dup.sum())
+            duplicates += n_dup
+            if n_dup == 0:
+                cubes.append(self.load_cube(cid, chats[cid], dayfirst))
+            elif n_dup < len(dup):
+                df = self.load(cid, chats[cid], dayfirst)
+                cubes.append(cube.buildCube(df[~dup]))
+            else:
+                continue
+            taken.append(cid)
+        return cube.mergeCubes(cubes), duplicates
+
+    def _prune(self, cid):
+        """Keep the store under its size cap after writing cid"""
+        chat_store.prune(self.store_max_bytes, self.cache_dir, keep=cid)
+
+    def _record(self, cid, data):
+        if self.cache_dir:
+            chat_store.save_meta(cid, {'size': len(data), 'head': chat_id(data[:HEAD_BYTES])},
+                                 store_dir=self.cache_dir)
+
+    def _find_parent(self, data):
+        """The largest stored chat whose export is a prefix of data, as (cid, size).
+
+        The prefix must end at a line break followed by a new message, so
+        the stored chat's last message can't have grown in the new export.
+        """
+        heads = {}
+        for meta in chat_store.chat_metas(self.cache_dir):
+            size = meta['size']
+            if size >= len(data) or data[size - 1:size] != b"\n":
+                continue
+            n = min(size, HEAD_BYTES)
+            if n not in heads:
+                heads[n] = chat_id(data[:n])
+            if (heads[n] == meta['head'] and functions._is_message_start(data, size)
+                    and chat_id(data[:size]) == meta['cid']):
+                return meta['cid'], size
+        return None
+
+    def _extend(self, cid, data):
+        """Parse only the messages appended to an export of a stored chat.
+
+        The tail is appended to the stored raw parse, to every stored
+        PreProcess variant and to their stored cubes, all saved under the new
+        chat id. Returns the raw frame, or None if no stored chat is a prefix.
+        """
+        if not self.cache_dir:
+            return None
+        parent = self._find_parent(data)
+        if parent is None:
+            return None
+        parent_cid, size = parent
+        base = self.get((parent_cid, None))
+        if base is None:
+            return None
+        # Everything is read from the parent before anything is written and
+        # the store pruned once at the end, so the parent can't be evicted
+        # halfway through
+        processed = {dayfirst: self.get((parent_cid, dayfirst)) for dayfirst in (True, False)}
+        stored = {dayfirst: chat_store.load_cube(parent_cid, dayfirst, store_dir=self.cache_dir)
+                  for dayfirst, frame in processed.items() if frame is not None}
+        tail = functions.generateDataFrame(io.BytesIO(data[size:]))
+        df = functions.concatChats([base, tail])
+        self._write((cid, None), df)
+        self._record(cid, data)
+        for dayfirst, frame in processed.items():
+            if frame is None:
+                continue
+            tail_processed = functions.PreProcess(tail, dayfirst)
+            self._write((cid, dayfirst), functions.concatChats([frame, tail_processed]))
+            if stored[dayfirst] is not None:
+                merged = cube.mergeCubes([stored[dayfirst], cube.buildCube(tail_processed)])
+                chat_store.save_cube(cid, merged, dayfirst, store_dir=self.cache_dir)
+        self._prune(cid)
+        return df
+
+
+# Shared by every Streamlit session in this process
+cache = ChatCache()
@@ -0,0 +1,195 @@
+import contextlib
+import json
+import os
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pyarrow.feather as feather
+
+# Directory holding parsed chats as uncompressed Feather (Arrow IPC) files
+STORE_DIR = os.environ.get("CHAT_STORE_DIR", "chat_store")
+
+
+def chat_path(cid, dayfirst=None, store_dir=STORE_DIR, kind="feather"):
+    """Location of a stored chat; dayfirst=None is the raw parse"""
+    suffix = "raw" if dayfirst is None else ("dayfirst" if dayfirst else "monthfirst")
+    return os.path.join(store_dir, f"{cid}.{suffix}.{kind}")
+
+
+@contextlib.contextmanager
+def _replacing(path):
+    """Binary file that atomically replaces path once the block completes.
+
+    The data goes to a uniquely named temporary file in the same directory,
+    so concurrent writers (sessions are threads of one process) never share
+    it and readers only ever see a complete file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def _touch(path):
+    """Mark a stored file as just used, for prune's least-recently-used order"""
+    with contextlib.suppress(OSError):
+        os.utime(path)
+
+
+def has_chat(cid, dayfirst=None, store_dir=STORE_DIR):
+    """Check whether a parsed chat has been stored"""
+    return os.path.exists(chat_path(cid, dayfirst, store_dir))
+
+
+def save_chat(cid, df, dayfirst=None, store_dir=STORE_DIR):
+    """Persist a parsed chat in columnar form.
+
+    Files are left uncompressed so reloading skips decompression and is
+    dominated by converting the Arrow columns back to pandas; the write goes
+    to a temporary name first so readers never see a partial file.
+    """
+    path = chat_path(cid, dayfirst, store_dir)
+    with _replacing(path) as f:
+        feather.write_feather(df, f, compression="uncompressed")
+    return path
+
+
+def _write_json(path, obj):
+    with _replacing(path) as f:
+        f.write(json.dumps(obj, ensure_ascii=False, default=int).encode("utf-8"))
+
+
+def load_chat(cid, dayfirst=None, store_dir=STORE_DIR):
+    """Reopen a stored chat as a regular pandas frame, or None if it is missing.
+
+    to_pandas copies every column (Message back into Python strings), so the
+    file is read normally rather than memory-mapped; a map would save nothing.
+    """
+    path = chat_path(cid, dayfirst, store_dir)
+    if not os.path.exists(path):
+        return None
+    _touch(path)
+    return feather.read_table(path).to_pandas()
+
+
+def save_cube(cid, cube, dayfirst, store_dir=STORE_DIR):
+    """Persist a cube.buildCube result: cells as Feather, word and emoji tables as JSON"""
+    with _replacing(chat_path(cid, dayfirst, store_dir, "cube.feather")) as f:
+        feather.write_feather(cube["cells"], f, compression="uncompressed")
+    _write_json(chat_path(cid, dayfirst, store_dir, "counts.json"),
+                {key: cube[key] for key in ("words", "emojis", "total_words", "total_emojis")})
+
+
+def load_cube(cid, dayfirst, store_dir=STORE_DIR):
+    """Reopen a stored cube, or None if it is missing"""
+    path = chat_path(cid, dayfirst, store_dir, "counts.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        counts = json.load(f)
+    _touch(path)
+    return {
+        "cells": feather.read_table(chat_path(cid, dayfirst, store_dir, "cube.feather")).to_pandas(),
+        "words": {user: Counter(c) for user, c in counts["words"].items()},
+        "emojis": {user: Counter(c) for user, c in counts["emojis"].items()},
+        "total_words": Counter(counts["total_words"]),
+        "total_emojis": Counter(counts["total_emojis"]),
+    }
+
+
+def save_keys(cid, keys, dayfirst, store_dir=STORE_DIR):
+    """Persist a chat's functions.messageKeys fingerprints as a .npy array"""
+    with _replacing(chat_path(cid, dayfirst, store_dir, "keys.npy")) as f:
+        np.save(f, keys)
+
+
+def load_keys(cid, dayfirst, store_dir=STORE_DIR):
+    """Reopen a chat's stored message fingerprints, or None if they are missing"""
+    path = chat_path(cid, dayfirst, store_dir, "keys.npy")
+    if not os.path.exists(path):
+        return None
+    _touch(path)
+    return np.load(path)
+
+
+def save_index(cid, index, dayfirst, store_dir=STORE_DIR):
+    """Persist a search.buildIndex result as one uncompressed .npz archive"""
+    arrays = {key: value for key, value in index.items() if isinstance(value, np.ndarray)}
+    # Tokens and sender names never contain line breaks, so lists are stored joined
+    for key in ("vocab", "user_names"):
+        arrays[key] = np.frombuffer("\n".join(index[key]).encode("utf-8"), dtype=np.uint8)
+    with _replacing(chat_path(cid, dayfirst, store_dir, "index.npz")) as f:
+        np.savez(f, **arrays)
+
+
+def load_index(cid, dayfirst, store_dir=STORE_DIR):
+    """Reopen a stored search index, or None if it is missing"""
+    path = chat_path(cid, dayfirst, store_dir, "index.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as archive:
+        index = {key: archive[key] for key in archive.files}
+    _touch(path)
+    for key in ("vocab", "user_names"):
+        text = index[key].tobytes().decode("utf-8")
+        index[key] = text.split("\n") if text else []
+    return index
+
+
+def save_meta(cid, meta, store_dir=STORE_DIR):
+    """Record facts about a stored chat's export, e.g. its size and head hash"""
+    _write_json(os.path.join(store_dir, f"{cid}.meta.json"), dict(meta, cid=cid))
+
+
+def chat_metas(store_dir=STORE_DIR):
+    """Metadata of every stored chat that has any, largest export first"""
+    if not os.path.isdir(store_dir):
+        return []
+    metas = []
+    for name in os.listdir(store_dir):
+        if name.endswith(".meta.json"):
+            with open(os.path.join(store_dir, name), encoding="utf-8") as f:
+                metas.append(json.load(f))
+    return sorted(metas, key=lambda meta: meta["size"], reverse=True)
+
+
+def prune(max_bytes, store_dir=STORE_DIR, keep=None):
+    """Delete least recently used chats until the store fits in max_bytes.
+
+    A chat is every file named after its id (parses, cubes, keys, index and
+    meta) and is removed as a whole; its last use is the newest modification
+    time among them, which the load functions refresh. keep is never removed.
+    Returns the ids of the removed chats.
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    chats = {}
+    for entry in os.scandir(store_dir):
+        if not entry.is_file() or entry.name.endswith(".tmp"):
+            continue
+        stat = entry.stat()
+        chat = chats.setdefault(entry.name.split(".", 1)[0], {"size": 0, "used": 0, "paths": []})
+        chat["size"] += stat.st_size
+        chat["used"] = max(chat["used"], stat.st_mtime)
+        chat["paths"].append(entry.path)
+    total = sum(chat["size"] for chat in chats.values())
+    removed = []
+    for cid, chat in sorted(chats.items(), key=lambda item: item[1]["used"]):
+        if total <= max_bytes:
+            break
+        if cid == keep:
+            continue
+        for path in chat["paths"]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        total -= chat["size"]
+        removed.append(cid)
+    return removed
@@ -0,0 +1,90 @@
+from collections import Counter
+
+import functions
+import metrics
+
+# Cells are keyed by user, calendar date and hour; the other calendar fields
+# follow from the date and ride along so views can group on them directly
+CUBE_KEYS = ['User', 'Date', 'year', 'month', 'month_name', 'day', 'hour']
+MEASURES = ['messages', 'words', 'media', 'links', 'deleted', 'emojis']
+
+
+@metrics.timed('stats', rows='input')
+def buildCube(df, stop_words=None, link_mode=None):
+    """Aggregate a preprocessed chat once for every user.
+
+    Returns a dict with 'cells', one row per (user, date, hour) holding the
+    message, word, media, link, deleted and emoji counts, plus per-user word
+    and emoji tables and their chat-wide totals. Everything the dashboard
+    shows for any user can be read from it without touching the messages.
+    """
+    s = functions.messageStats(df, stop_words, link_mode)
+    rows = df[CUBE_KEYS].assign(
+        messages=s['kept'].astype('int32'),
+        words=s['words'],
+        media=s['media'].astype('int32'),
+        links=s['links'],
+        deleted=s['deleted'].astype('int32'),
+        emojis=s['emojis'],
+    )
+    cells = rows.groupby(CUBE_KEYS, observed=True, sort=False)[MEASURES].sum().reset_index()
+    return {
+        'cells': cells,
+        'words': s['user_words'],
+        'emojis': s['user_emojis'],
+        'total_words': functions.mergeCounts(s['user_words'].values()),
+        'total_emojis': functions.mergeCounts(s['user_emojis'].values()),
+    }
+
+
+def mergeCubes(cubes):
+    """Combine cubes of disjoint sets of messages into one.
+
+    Every measure is a sum, so cells sharing a key are added up and the
+    word and emoji tables merged; the result matches buildCube over all the
+    messages at once.
+    """
+    cells = functions.concatChats([c['cells'] for c in cubes])
+    cells = cells.groupby(CUBE_KEYS, observed=True, sort=False)[MEASURES].sum().reset_index()
+    words, emojis = {}, {}
+    for c in cubes:
+        for user, counts in c['words'].items():
+            words.setdefault(user, Counter()).update(counts)
+        for user, counts in c['emojis'].items():
+            emojis.setdefault(user, Counter()).update(counts)
+    return {
+        'cells': cells,
+        'words': words,
+        'emojis': emojis,
+        'total_words': functions.mergeCounts(words.values()),
+        'total_emojis': functions.mergeCounts(emojis.values()),
+    }
+
+
+def userView(cube, user):
+    """Slice the cube for one user, or the whole chat for 'Everyone'.
+
+    The result has the same keys as functions.analyzeChat, with 'df' holding
+    the user's cells that contain messages, so getStats, getEmoji,
+    MostCommonWords, create_wordcloud and the chart functions accept it.
+    """
+    cells = cube['cells']
+    if user == 'Everyone':
+        words, emojis = cube['total_words'], cube['total_emojis']
+        user_emojis = cube['emojis']
+    else:
+        cells = cells[cells['User'] == user]
+        words = cube['words'].get(user, Counter())
+        emojis = cube['emojis'].get(user, Counter())
+        user_emojis = {user: emojis}
+    return {
+        'df': cells[cells['messages'] > 0],
+        'media_cnt': int(cells['media'].sum()),
+        'deleted_msgs_cnt': int(cells['deleted'].sum()),
+        'links_cnt': int(cells['links'].sum()),
+        'word_count': int(cells['words'].sum()),
+        'msg_count': int(cells['messages'].sum()),
+        'emojis': emojis,
+        'user_emojis': user_emojis,
+        'words': words,
+    }
@@ -1,21 +1,19 @@
-import streamlit as st
+import io
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-import seaborn as sns
+import streamlit as st
 import functions
 import auth
-import time
-from datetime import datetime
-import os
-# No need to import io here as it's now in functions.py
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from functions import generate_pdf_report
+import charts
+import chat_cache
+import chat_store
+import cube
+import metrics
+import report
+import search
+from datetime import datetime, timedelta
+
+# Newest search hits listed under the search box
+SEARCH_RESULTS = 200
 
 # Set page configuration
 st.set_page_config(
@@ -28,6 +26,11 @@ st.set_page_config(
 # Initialize session state
 auth.init_session_state()
 
+# Record stage timings for the debug panel on this run only
+recorder = metrics.Recorder(memory=st.session_state.get('debug_memory', False)) \
+    if st.session_state.get('debug_panel') else None
+metrics.activate(recorder)
+
 # Apply custom CSS
 st.markdown("""
 <style>
@@ -161,15 +164,27 @@ with st.sidebar:
         
             # Show user history
         with st.expander("Your Analysis History"):
-                history = auth.get_user_history(st.session_state.username)
+                history = auth.get_user_history(st.session_state.username, limit=5)  # Show only last 5 analyses
                 if history:
-                    for i, entry in enumerate(reversed(history)):
-                        if i >= 5:  # Show only last 5 analyses
-                            break
+                    for i, entry in enumerate(history):
                         st.write(f"📊 {entry['file_name']} - {entry['timestamp'].strftime('%d %b, %H:%M')}")
+                        # Chats parsed earlier can be reopened straight from the store
+                        cid = entry.get('chat_id')
+                        if cid and chat_store.has_chat(cid):
+                            if st.button("Reopen", key=f"reopen_{i}"):
+                                st.session_state.chat_id = cid
+                                st.session_state.file_name = entry['file_name']
+                                st.session_state.reopened = True
+                                st.session_state.pop('selected_user', None)
+                                st.rerun()
                 else:
                     st.write("No analysis history yet")
         
+        # Stage timings for diagnosing slow analyses
+        st.checkbox("Show debug panel", key="debug_panel")
+        if st.session_state.get('debug_panel'):
+            st.checkbox("Track peak memory (slower)", key="debug_memory")
+        
         # Logout button
         if st.button("Logout"):
             auth.logout_user()
@@ -194,7 +209,8 @@ with st.sidebar:
                     auth.record_analysis(
                         st.session_state.username, 
                         st.session_state.file_name, 
-                        f"Analysis for {users_s}"
+                        f"Analysis for {users_s}",
+                        chat_id=st.session_state.get('chat_id')
                     )
 
 # Main page content
@@ -225,13 +241,23 @@ if st.session_state.logged_in:
     
     file = st.file_uploader("Choose WhatsApp chat export file (.txt)", type=["txt"])
     
-    # Process the uploaded file
-    if file:
+    # Hash a new upload once; later reruns reuse the id to hit the cache
+    if file and st.session_state.get('file_id') != file.file_id:
+        st.session_state.file_id = file.file_id
+        st.session_state.chat_id = chat_cache.chat_id(file.getvalue())
         st.session_state.file_name = file.name
-        
+        st.session_state.reopened = False
+    
+    # A chat reopened from history is read from the store instead
+    if st.session_state.get('reopened'):
+        file = None
+        st.info(f"Showing stored analysis of {st.session_state.file_name}")
+    
+    # Process the uploaded file
+    if file or st.session_state.get('reopened'):
         with st.spinner('Processing your chat file...'):
             try:
-                df = functions.generateDataFrame(file)
+                df = chat_cache.cache.load(st.session_state.chat_id, file)
                 
                 # Storing users in session state for sidebar
                 users = functions.getUsers(df)
@@ -251,19 +277,51 @@ if st.session_state.logged_in:
                     dayfirst = True
                 else:
                     dayfirst = False
-                
+
+                # Message search, answered from an inverted index built on the
+                # first query and kept in the store next to the chat
+                with st.expander("🔍 Search Messages"):
+                    st.caption('Words match whole words, "quoted words" match a phrase and word* a prefix.')
+                    query = st.text_input("Search for", key="search_query")
+                    search_col1, search_col2 = st.columns(2)
+                    with search_col1:
+                        search_user = st.selectbox("From", users, key="search_user")
+                    with search_col2:
+                        search_dates = st.date_input("Between", value=(), key="search_dates")
+
+                    if query:
+                        index_key = (st.session_state.chat_id, dayfirst)
+                        if st.session_state.get('index_key') != index_key:
+                            st.session_state.search_index = chat_cache.cache.load_index(st.session_state.chat_id, file, dayfirst)
+                            st.session_state.index_key = index_key
+                        start = end = None
+                        if len(search_dates) == 2:
+                            start, end = search_dates[0], search_dates[1] + timedelta(days=1)
+                        hits = search.search(st.session_state.search_index, query, search_user, start, end)
+                        st.write(f"{len(hits)} matching messages")
+                        if len(hits):
+                            st.dataframe(
+                                chat_cache.cache.load(st.session_state.chat_id, file, dayfirst)
+                                .iloc[hits[-SEARCH_RESULTS:][::-1]][['timestamp', 'User', 'Message']],
+                                hide_index=True, use_container_width=True
+                            )
+
                 # Check if user has selected analysis in sidebar
                 if 'selected_user' in st.session_state:
                     selected_user = st.session_state.selected_user
                     
                     st.markdown(f'<h2 class="sub-header">Analysis Results for: {selected_user}</h2>', unsafe_allow_html=True)
                     
-                    df = functions.PreProcess(df, dayfirst)
-                    if selected_user != "Everyone":
-                        df = df[df['User'] == selected_user]
+                    # Aggregate the chat once per upload and date format; every
+                    # view below, for any user, reads from this cube
+                    cube_key = (st.session_state.chat_id, dayfirst)
+                    if st.session_state.get('cube_key') != cube_key:
+                        st.session_state.cube = chat_cache.cache.load_cube(st.session_state.chat_id, file, dayfirst)
+                        st.session_state.cube_key = cube_key
                     
                     # Get statistics
-                    df, media_cnt, deleted_msgs_cnt, links_cnt, word_count, msg_count = functions.getStats(df)
+                    analysis = cube.userView(st.session_state.cube, selected_user)
+                    df, media_cnt, deleted_msgs_cnt, links_cnt, word_count, msg_count = functions.getStats(analysis)
                     
                     # Display chat statistics in an attractive layout
                     st.markdown('<h2 class="sub-header">Chat Overview</h2>', unsafe_allow_html=True)
@@ -303,34 +361,29 @@ if st.session_state.logged_in:
                     # Add a divider
                     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
                     
+                    # Render every chart for this view up front; cached images
+                    # make reruns cheap and misses are drawn concurrently
+                    images = charts.cache.render_all(
+                        cube_key, selected_user, analysis, charts.dashboard_charts(analysis, selected_user)
+                    )
+                    
                     # User Activity Count (only for Everyone)
                     if selected_user == 'Everyone':
                         st.markdown('<h2 class="sub-header">User Activity Analysis</h2>', unsafe_allow_html=True)
                         
-                        # User count visualization
-                        user_counts = df['User'].value_counts()
-                        
                         # Create two columns for the user activity
                         user_col1, user_col2 = st.columns(2)
                         
                         with user_col1:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Message Count by User")
-                            fig, ax = plt.subplots()
-                            bars = ax.bar(user_counts.index, user_counts.values, color=sns.color_palette("viridis", len(user_counts)))
-                            plt.xticks(rotation='vertical')
-                            plt.ylabel("Number of Messages")
-                            st.pyplot(fig)
+                            st.image(images['users_bar'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                         
                         with user_col2:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Message Percentage by User")
-                            fig, ax = plt.subplots()
-                            plt.pie(user_counts.values, labels=user_counts.index, autopct='%1.1f%%', startangle=90, 
-                                   colors=sns.color_palette("viridis", len(user_counts)))
-                            plt.axis('equal')
-                            st.pyplot(fig)
+                            st.image(images['users_pie'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                         
                         # Add a divider
@@ -339,7 +392,7 @@ if st.session_state.logged_in:
                     # Emoji Analysis
                     st.markdown('<h2 class="sub-header">Emoji Analysis</h2>', unsafe_allow_html=True)
                     
-                    emoji_df = functions.getEmoji(df)
+                    emoji_df = functions.getEmoji(analysis)
                     
                     if not emoji_df.empty:
                         emoji_df.columns = ['Emoji', 'Count']
@@ -350,25 +403,13 @@ if st.session_state.logged_in:
                         with emoji_col1:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Top Emojis Used")
-                            
-                            fig, ax = plt.subplots()
-                            # Show only top 10 emojis
-                            top_emojis = emoji_df.head(10)
-                            ax.bar(top_emojis['Emoji'], top_emojis['Count'], color=sns.color_palette("YlOrRd", len(top_emojis)))
-                            plt.xticks(rotation='vertical')
-                            st.pyplot(fig)
+                            st.image(images['emoji_bar'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                         
                         with emoji_col2:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Emoji Distribution")
-                            
-                            top_emojis = emoji_df.head(8)  # Limit to top 8 for better visualization
-                            fig, ax = plt.subplots()
-                            plt.pie(top_emojis['Count'], labels=top_emojis['Emoji'], autopct='%1.1f%%', startangle=90,
-                                   colors=sns.color_palette("YlOrRd", len(top_emojis)))
-                            plt.axis('equal')
-                            st.pyplot(fig)
+                            st.image(images['emoji_pie'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                     else:
                         st.info("No emojis found in the selected chat.")
@@ -379,7 +420,7 @@ if st.session_state.logged_in:
                     # Most Common Words Analysis
                     st.markdown('<h2 class="sub-header">Most Common Words</h2>', unsafe_allow_html=True)
                     
-                    common_words = functions.MostCommonWords(df)
+                    common_words = functions.MostCommonWords(analysis)
                     if not common_words.empty:
                         common_words.columns = ['Word', 'Count']
                         
@@ -388,29 +429,17 @@ if st.session_state.logged_in:
                         with words_col1:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Top Words")
-                            
-                            fig, ax = plt.subplots()
-                            y_pos = np.arange(len(common_words.head(10)))
-                            ax.barh(y_pos, common_words.head(10)['Count'], align='center', color=sns.color_palette("Blues_r", len(common_words.head(10))))
-                            ax.set_yticks(y_pos)
-                            ax.set_yticklabels(common_words.head(10)['Word'])
-                            ax.invert_yaxis()
-                            plt.xlabel('Frequency')
-                            st.pyplot(fig)
+                            st.image(images['words_bar'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                         
                         with words_col2:
                             st.markdown('<div class="card">', unsafe_allow_html=True)
                             st.subheader("Word Cloud")
                             
-                            try:
-                                word_cloud = functions.create_wordcloud(df)
-                                fig, ax = plt.subplots()
-                                plt.imshow(word_cloud, interpolation='bilinear')
-                                plt.axis('off')
-                                st.pyplot(fig)
-                            except Exception as e:
-                                st.error(f"Error generating wordcloud: {e}")
+                            if isinstance(images['wordcloud'], Exception):
+                                st.error(f"Error generating wordcloud: {images['wordcloud']}")
+                            else:
+                                st.image(images['wordcloud'], use_column_width=True)
                             st.markdown('</div>', unsafe_allow_html=True)
                     else:
                         st.info("No common words found after filtering stop words.")
@@ -426,31 +455,25 @@ if st.session_state.logged_in:
                     with col1:
                         st.markdown('<div class="card">', unsafe_allow_html=True)
                         st.subheader("Daily Activity")
-                        functions.WeekAct(df)
+                        st.image(images['week'], use_column_width=True)
                         st.markdown('</div>', unsafe_allow_html=True)
                     
                     with col2:
                         st.markdown('<div class="card">', unsafe_allow_html=True)
                         st.subheader("Monthly Activity")
-                        functions.MonthAct(df)
+                        st.image(images['month'], use_column_width=True)
                         st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Daily timeline
                     st.markdown('<div class="card">', unsafe_allow_html=True)
-                    functions.dailytimeline(df)
+                    st.title('Daily Timeline')
+                    st.image(images['timeline'], use_column_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Activity heatmap
                     st.markdown('<div class="card">', unsafe_allow_html=True)
                     st.subheader("Activity Heatmap")
-                    
-                    user_heatmap = functions.activity_heatmap(df)
-                    fig, ax = plt.subplots(figsize=(12, 8))
-                    sns.heatmap(user_heatmap, cmap="YlGnBu", ax=ax)
-                    plt.title('Activity Heat Map')
-                    plt.xlabel('Hour of Day')
-                    plt.ylabel('Day of Week')
-                    st.pyplot(fig)
+                    st.image(images['heatmap'], use_column_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Add a divider
@@ -463,12 +486,9 @@ if st.session_state.logged_in:
                     if st.button("Generate PDF Report", key="pdf_report"):
                         with st.spinner("Generating PDF report..."):
                             try:
-                                # Generate PDF using the imported function
-                                pdf_buffer = functions.generate_pdf_report(
-                                    df, media_cnt, deleted_msgs_cnt, links_cnt, 
-                                    word_count, msg_count, selected_user,
-                                    emoji_df=emoji_df if 'emoji_df' in locals() else None,
-                                    common_words=common_words if 'common_words' in locals() else None
+                                # Build the PDF from the view's aggregates and the charts shown above
+                                pdf_buffer = report.write_report(
+                                    report.report_data(analysis, selected_user), io.BytesIO(), images
                                 )
                                 
                                 # Create download button
@@ -486,7 +506,7 @@ if st.session_state.logged_in:
                                 
                                 st.download_button(
                                     label="Click here if download doesn't start automatically",
-                                    data=pdf_buffer,
+                                    data=pdf_buffer.getvalue(),
                                     file_name=filename,
                                     mime="application/pdf",
                                     key="download_pdf"
@@ -498,7 +518,8 @@ if st.session_state.logged_in:
                                     auth.record_analysis(
                                         st.session_state.username, 
                                         st.session_state.file_name, 
-                                        f"Downloaded PDF report for {selected_user}"
+                                        f"Downloaded PDF report for {selected_user}",
+                                        chat_id=st.session_state.get('chat_id')
                                        )
                                 
                                 
@@ -510,7 +531,83 @@ if st.session_state.logged_in:
             except Exception as e:
                 st.error(f"Error processing file: {e}")
                 st.error("Please make sure you've uploaded a valid WhatsApp chat export file.")
-    
+
+    # Multi-chat mode: several exports analysed as one, e.g. all of a
+    # person's groups, or overlapping exports of the same group
+    st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
+    st.markdown('<h2 class="sub-header">Combine Several Chats</h2>', unsafe_allow_html=True)
+
+    multi_files = st.file_uploader("Choose two or more WhatsApp chat exports (.txt)", type=["txt"],
+                                   accept_multiple_files=True, key="multi_files")
+
+    if len(multi_files) > 1:
+        with st.spinner('Combining your chat files...'):
+            try:
+                multi_dayfirst = st.radio("Select Date Format in the chat files:", ('dd-mm-yy', 'mm-dd-yy'),
+                                          horizontal=True, key="multi_dayfirst") == 'dd-mm-yy'
+
+                # Hash each upload once, like the single chat above
+                multi_ids = st.session_state.setdefault('multi_ids', {})
+                chats = {}
+                for multi_file in multi_files:
+                    if multi_file.file_id not in multi_ids:
+                        multi_ids[multi_file.file_id] = chat_cache.chat_id(multi_file.getvalue())
+                    chats[multi_ids[multi_file.file_id]] = multi_file
+
+                # Merge the per-chat cubes once per selection; messages shared
+                # by overlapping exports of one group are counted once
+                combined_key = ('combined', tuple(sorted(chats)), multi_dayfirst)
+                if st.session_state.get('combined_key') != combined_key:
+                    st.session_state.combined = chat_cache.cache.combine(chats, multi_dayfirst)
+                    st.session_state.combined_key = combined_key
+                combined, duplicates = st.session_state.combined
+
+                st.info(f"Combined {len(chats)} chats; {duplicates} messages found in overlapping exports of the same "
+                        f"group were counted once. Exports count as the same group when they share at least "
+                        f"{chat_cache.OVERLAP_RUN} consecutive messages, so a text sent to several groups counts in each.")
+
+                combined_user = st.selectbox("Select User to View Combined Analysis",
+                                             functions.getUsers(combined['cells']), key="combined_user")
+                combined_view = cube.userView(combined, combined_user)
+                _, media_cnt, deleted_msgs_cnt, links_cnt, word_count, msg_count = functions.getStats(combined_view)
+
+                for col, (label, value) in zip(st.columns(5), [
+                        ("Total Messages", msg_count), ("Total Words", word_count), ("Media Shared", media_cnt),
+                        ("Links Shared", links_cnt), ("Deleted Messages", deleted_msgs_cnt)]):
+                    with col:
+                        st.markdown('<div class="card">', unsafe_allow_html=True)
+                        st.markdown(f'<p class="stat-label">{label}</p>', unsafe_allow_html=True)
+                        st.markdown(f'<p class="stat-number">{value}</p>', unsafe_allow_html=True)
+                        st.markdown('</div>', unsafe_allow_html=True)
+
+                combined_images = charts.cache.render_all(combined_key, combined_user, combined_view, ['heatmap'])
+
+                words_col, heatmap_col = st.columns(2)
+                with words_col:
+                    st.markdown('<div class="card">', unsafe_allow_html=True)
+                    st.subheader("Top Words")
+                    st.dataframe(functions.MostCommonWords(combined_view).head(20)
+                                 .rename(columns={0: 'Word', 1: 'Count'}), hide_index=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                with heatmap_col:
+                    st.markdown('<div class="card">', unsafe_allow_html=True)
+                    st.subheader("Activity Heatmap")
+                    st.image(combined_images['heatmap'], use_column_width=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+
+            except Exception as e:
+                st.error(f"Error combining files: {e}")
+                st.error("Please make sure every file is a valid WhatsApp chat export.")
+
+    # Debug panel: every pipeline stage that ran during this rerun
+    if recorder is not None:
+        with st.expander("🛠️ Debug: pipeline stages", expanded=True):
+            if recorder.records:
+                st.dataframe(pd.DataFrame(recorder.records, columns=['stage', 'parent', 'rows', 'seconds', 'peak_mb']),
+                             hide_index=True, use_container_width=True)
+            else:
+                st.write("No stages ran on this rerun; everything came from the caches.")
+
     # Footer
     st.markdown('<div class="footer">', unsafe_allow_html=True)
     st.markdown("WhatsApp Chat Analyzer Project by Bhoomika N ")
@@ -0,0 +1,154 @@
+"""Wall time, rows and peak memory of each analysis stage.
+
+Library code marks its stages with the timed decorator or the stage context
+manager. Nothing is measured unless a recorder is active (see recording,
+used by the debug panel in main.py) or ANALYZER_METRICS is set, in which
+case every stage is also logged to the "analyzer.metrics" logger and,
+with ANALYZER_METRICS_FILE, appended to that file as one JSON object per
+line. Turned off, a stage costs one flag check.
+
+Peak memory is measured with tracemalloc, which slows the pipeline down
+noticeably, so it is only tracked when asked for: ANALYZER_METRICS=memory,
+or recording(memory=True). It covers Python and numpy allocations, not
+Arrow buffers. There is one tracer per process, so only the thread whose
+stage started it reads and resets the peak: stages on other threads (the
+chart pool, other sessions) are timed but report no peak of their own, and
+what they allocate counts towards the peak of the stage that encloses them.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+# "" (off), "time" or "memory"
+METRICS = os.environ.get("ANALYZER_METRICS", "")
+METRICS_FILE = os.environ.get("ANALYZER_METRICS_FILE", "")
+
+logger = logging.getLogger("analyzer.metrics")
+
+_recorder = contextvars.ContextVar("metrics_recorder", default=None)
+# Stages currently open, innermost last; copy_context() carries it into pools
+_stack = contextvars.ContextVar("metrics_stack", default=())
+_file_lock = threading.Lock()
+# Thread allowed to read and reset the tracemalloc peak, while it holds a stage open
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class Recorder:
+    """Collects the stage records of one analysis run"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+
+
+def _emit(record):
+    if not METRICS:
+        return
+    line = json.dumps(dict(record, at=round(time.time(), 3)), ensure_ascii=False, default=str)
+    logger.info(line)
+    if METRICS_FILE:
+        with _file_lock, open(METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextlib.contextmanager
+def _measure(name, rows, recorder):
+    global _tracer
+    record = {"stage": name, "rows": rows}
+    stack = _stack.get()
+    if stack:
+        record["parent"] = stack[-1]["stage"]
+    memory = recorder.memory if recorder is not None else METRICS == "memory"
+    claimed = started = False
+    if memory:
+        me = threading.get_ident()
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer, claimed = me, True
+                started = not tracemalloc.is_tracing()
+                if started:
+                    tracemalloc.start()
+        memory = _tracer == me
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack and "_peak" in stack[-1]:
+            stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+        record["_base"] = record["_peak"] = current
+    token = _stack.set(stack + (record,))
+    # Listed in start order, so a stage comes before the stages nested in it
+    if recorder is not None:
+        recorder.records.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        _stack.reset(token)
+        if memory:
+            peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = round((peak - record.pop("_base")) / 2**20, 2)
+            if stack and "_peak" in stack[-1]:
+                stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+            tracemalloc.reset_peak()
+        if claimed:
+            if started:
+                tracemalloc.stop()
+            with _tracer_lock:
+                _tracer = None
+        _emit(record)
+
+
+def stage(name, rows=None):
+    """Context manager measuring one stage; yields its record so rows can be filled in"""
+    recorder = _recorder.get()
+    if recorder is None and not METRICS:
+        return contextlib.nullcontext({})
+    return _measure(name, rows, recorder)
+
+
+def timed(name, rows=None):
+    """Decorator measuring every call of a function as a stage.
+
+    rows='input' counts the rows of the first argument, rows='output' those
+    of the return value.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder.get() is None and not METRICS:
+                return fn(*args, **kwargs)
+            with stage(name, len(args[0]) if rows == 'input' else None) as record:
+                result = fn(*args, **kwargs)
+                if rows == 'output':
+                    record["rows"] = len(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def activate(recorder):
+    """Make recorder (or None to stop recording) current for the rest of this context.
+
+    Meant for scripts like main.py that are rerun top to bottom; elsewhere
+    prefer recording.
+    """
+    _recorder.set(recorder)
+
+
+@contextlib.contextmanager
+def recording(memory=False):
+    """Collect the records of every stage run inside the block into a Recorder"""
+    recorder = Recorder(memory)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
@@ -0,0 +1,167 @@
+"""PDF report of a chat analysis, built from precomputed aggregates.
+
+report_data reduces a cube.userView result to the handful of small tables
+the report shows; write_report lays them out together with chart images
+already rendered for the dashboard (see charts.py) and writes the PDF to a
+path or a binary stream.
+"""
+import functools
+import io
+from datetime import datetime
+
+import functions
+import metrics
+
+HEADER_COLOR = "#128C7E"
+TITLE_COLOR = "#075E54"
+# Widest a chart may be on the page, in points
+CHART_WIDTH = 450
+# Charts embedded after each section, when an image is supplied for them
+SECTION_CHARTS = {
+    'users': ['users_bar'],
+    'emojis': ['emoji_bar'],
+    'words': ['wordcloud'],
+    'activity': ['week', 'month', 'timeline', 'heatmap'],
+}
+
+
+def report_data(view, user):
+    """Aggregates shown in the report for one user's view of the cube"""
+    df = view['df']
+    msg_count = view['msg_count']
+    data = {
+        'user': user,
+        'stats': [
+            ("Total Messages", msg_count),
+            ("Total Words", view['word_count']),
+            ("Media Shared", view['media_cnt']),
+            ("Links Shared", view['links_cnt']),
+            ("Deleted Messages", view['deleted_msgs_cnt']),
+        ],
+        'users': None,
+        'emojis': view['emojis'].most_common(10),
+        'words': view['words'].most_common(10),
+        'days': list(functions.messageCounts(df, 'day').sort_values(ascending=False).items()),
+        'months': list(functions.messageCounts(df, 'month_name').sort_values(ascending=False).items()),
+    }
+    if user == 'Everyone':
+        user_counts = functions.messageCounts(df, 'User').drop('Notifications', errors='ignore')
+        data['users'] = [(name, count, round(count / msg_count * 100, 2))
+                         for name, count in user_counts.sort_values(ascending=False).items()]
+    return data
+
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    """Paragraph and table styles, built once and shared by every report"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16,
+                                textColor=colors.HexColor(TITLE_COLOR), spaceAfter=12),
+        'subtitle': ParagraphStyle('Subtitle', parent=styles['Heading2'], fontSize=14,
+                                   textColor=colors.HexColor(HEADER_COLOR), spaceAfter=8),
+        'normal': ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10, spaceAfter=6),
+        'table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(HEADER_COLOR)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+    }
+
+
+def _table(header, rows, col_widths):
+    from reportlab.platypus import Table
+    table = Table([header] + [[str(cell) for cell in row] for row in rows], colWidths=col_widths)
+    table.setStyle(_styles()['table'])
+    return table
+
+
+def _charts(images, section):
+    """Image flowables for a section's charts, scaled to CHART_WIDTH"""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image, Spacer
+
+    flowables = []
+    for name in SECTION_CHARTS[section]:
+        image = images.get(name)
+        if not isinstance(image, bytes):
+            continue
+        width, height = ImageReader(io.BytesIO(image)).getSize()
+        flowables += [Image(io.BytesIO(image), CHART_WIDTH, CHART_WIDTH * height / width), Spacer(1, 12)]
+    return flowables
+
+
+def _elements(data, images):
+    """The report's flowables, in page order"""
+    from reportlab.platypus import Paragraph, Spacer
+
+    styles = _styles()
+    elements = [
+        Paragraph(f"WhatsApp Chat Analysis Report - {data['user']}", styles['title']),
+        Spacer(1, 12),
+        Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y at %H:%M')}", styles['normal']),
+        Spacer(1, 12),
+        Paragraph("Chat Overview", styles['subtitle']),
+        _table(["Metric", "Value"], data['stats'], [250, 100]),
+        Spacer(1, 12),
+    ]
+
+    if data['users'] is not None:
+        elements += [
+            Paragraph("User Activity", styles['subtitle']),
+            _table(["User", "Message Count", "Percentage"],
+                   [(name, count, f"{pct}%") for name, count, pct in data['users']], [150, 100, 100]),
+            Spacer(1, 12),
+        ] + _charts(images, 'users')
+
+    if data['emojis']:
+        elements += [
+            Paragraph("Top Emojis Used", styles['subtitle']),
+            _table(["Emoji", "Count"], data['emojis'], [150, 100]),
+            Spacer(1, 12),
+        ] + _charts(images, 'emojis')
+
+    if data['words']:
+        elements += [
+            Paragraph("Most Common Words", styles['subtitle']),
+            _table(["Word", "Count"], data['words'], [150, 100]),
+            Spacer(1, 12),
+        ] + _charts(images, 'words')
+
+    elements += [
+        Paragraph("Activity Patterns", styles['subtitle']),
+        Paragraph("Messages by Day of Week", styles['normal']),
+        _table(["Day", "Message Count"], data['days'], [150, 100]),
+        Spacer(1, 12),
+        Paragraph("Messages by Month", styles['normal']),
+        _table(["Month", "Message Count"], data['months'], [150, 100]),
+        Spacer(1, 12),
+    ] + _charts(images, 'activity')
+    return elements
+
+
+def write_report(data, out, images=None):
+    """Write the PDF for report_data output to a path or binary stream.
+
+    images maps chart names to PNG bytes, e.g. from charts.cache.render_all;
+    charts without an image are left out. Returns out.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Image, SimpleDocTemplate
+
+    with metrics.stage('pdf') as record:
+        elements = _elements(data, images or {})
+        # Table rows plus embedded charts
+        tables = ('stats', 'users', 'emojis', 'words', 'days', 'months')
+        record['rows'] = (sum(len(data[table] or ()) for table in tables)
+                          + sum(isinstance(element, Image) for element in elements))
+        SimpleDocTemplate(out, pagesize=letter).build(elements)
+    return out
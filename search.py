@@ -0,0 +1,164 @@
+"""Full-text search over a chat's messages through an inverted index.
+
+buildIndex tokenizes every message once into lowercase word tokens and keeps,
+for each distinct token, the rows (and positions within the row) it occurs
+at. Postings are grouped by token in vocabulary order, so a term is one
+slice, a prefix is one contiguous run of slices and a phrase is an
+intersection of position-shifted slices; no query touches the message text.
+"""
+import bisect
+import itertools
+import re
+from array import array
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import functions
+import metrics
+
+_WORD = re.compile(r'\w+')
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+# Phrase matching packs (row, position) into one int64 key
+_POSITION_BITS = 16
+
+
+def _tokens(text):
+    return _WORD.findall(text.lower())
+
+
+@metrics.timed('index', rows='input')
+def buildIndex(df):
+    """Inverted index of a preprocessed chat, addressed by row position.
+
+    Media and deleted placeholders are left out. The result is a dict of
+    plain lists and arrays so chat_store can persist it as is.
+    """
+    ids = defaultdict(itertools.count().__next__)
+    term_ids, rows, positions = array('i'), array('i'), array('H')
+    skip = {functions.MEDIA_MESSAGE, functions.DELETED_MESSAGE}
+    for row, message in enumerate(df['Message']):
+        if message in skip:
+            continue
+        tokens = _tokens(message)[:1 << _POSITION_BITS]
+        term_ids.extend(map(ids.__getitem__, tokens))
+        rows.extend(itertools.repeat(row, len(tokens)))
+        positions.extend(range(len(tokens)))
+
+    # Renumber terms alphabetically so prefixes map to a contiguous id range
+    vocab = sorted(ids, key=ids.__getitem__)
+    order = np.argsort(np.array(vocab, dtype=object), kind='stable')
+    rank = np.empty(len(vocab), dtype=np.int32)
+    rank[order] = np.arange(len(vocab), dtype=np.int32)
+    term_ids = rank[np.frombuffer(term_ids, dtype=np.int32)]
+    # A stable sort keeps each term's postings in (row, position) order
+    postings = np.argsort(term_ids, kind='stable')
+
+    users = df['User'].astype('category')
+    return {
+        'vocab': [vocab[i] for i in order],
+        'offsets': np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))]).astype(np.int64),
+        'rows': np.frombuffer(rows, dtype=np.int32)[postings],
+        'positions': np.frombuffer(positions, dtype=np.uint16)[postings],
+        'users': users.cat.codes.to_numpy(dtype=np.int32),
+        'user_names': users.cat.categories.astype(str).tolist(),
+        'timestamps': df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+    }
+
+
+def _term_range(index, term, prefix=False):
+    vocab = index['vocab']
+    lo = bisect.bisect_left(vocab, term)
+    if prefix:
+        hi = bisect.bisect_left(vocab, term + '\U0010ffff', lo)
+    else:
+        hi = lo + 1 if lo < len(vocab) and vocab[lo] == term else lo
+    return index['offsets'][lo], index['offsets'][hi]
+
+
+def _distinct(rows):
+    """Unique values of an already sorted array"""
+    if len(rows) == 0:
+        return rows
+    return rows[np.concatenate([[True], rows[1:] != rows[:-1]])]
+
+
+def _intersect(a, b):
+    """Values present in both sorted, duplicate-free arrays"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    found = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[found] == a]
+
+
+def _term_rows(index, term, prefix=False):
+    start, stop = _term_range(index, term, prefix)
+    rows = index['rows'][start:stop]
+    return np.unique(rows) if prefix else _distinct(rows)
+
+
+def _phrase_rows(index, tokens):
+    """Rows where the tokens appear consecutively, in order"""
+    matches = None
+    for shift, token in enumerate(tokens):
+        start, stop = _term_range(index, token)
+        rows, positions = index['rows'][start:stop], index['positions'][start:stop]
+        # A token at position p can only continue a phrase that began at p - shift
+        later = positions >= shift
+        keys = ((rows[later].astype(np.int64) << _POSITION_BITS) | positions[later]) - shift
+        matches = keys if matches is None else _intersect(matches, keys)
+    return _distinct(matches >> _POSITION_BITS)
+
+
+def parseQuery(query):
+    """Split a query into ('term'|'prefix'|'phrase', tokens) clauses.
+
+    "quoted text" is a phrase, a word ending in * a prefix and any other
+    word a term; words that tokenize into several tokens, like "don't",
+    become phrases.
+    """
+    clauses = []
+    for quoted, word in _QUERY.findall(query):
+        tokens = _tokens(quoted if quoted else word)
+        if not tokens:
+            continue
+        if word.endswith('*') and len(tokens) == 1:
+            clauses.append(('prefix', tokens))
+        elif len(tokens) == 1:
+            clauses.append(('term', tokens))
+        else:
+            clauses.append(('phrase', tokens))
+    return clauses
+
+
+def search(index, query, user=None, start=None, end=None):
+    """Row positions of the messages matching every clause of query.
+
+    Rows are in chat order. user restricts to one sender ('Everyone' or
+    None for all); start and end bound the timestamp to [start, end). An
+    empty query matches every message that passes the filters.
+    """
+    hits = None
+    for kind, tokens in parseQuery(query):
+        if kind == 'phrase':
+            rows = _phrase_rows(index, tokens)
+        else:
+            rows = _term_rows(index, tokens[0], prefix=kind == 'prefix')
+        hits = rows if hits is None else _intersect(hits, rows)
+        if len(hits) == 0:
+            return hits
+    if hits is None:
+        hits = np.arange(len(index['users']), dtype=np.int32)
+
+    if user is not None and user != 'Everyone':
+        if user not in index['user_names']:
+            return hits[:0]
+        hits = hits[index['users'][hits] == index['user_names'].index(user)]
+    if start is not None:
+        hits = hits[index['timestamps'][hits] >= pd.Timestamp(start).value]
+    if end is not None:
+        hits = hits[index['timestamps'][hits] < pd.Timestamp(end).value]
+    return hits
@@ -0,0 +1,32 @@
+import functools
+import os
+from collections import Counter
+
+# Stop-word lists live next to this module as stop_<language>.txt, one word per line
+STOPWORDS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LANGUAGES = ("hinglish",)
+
+
+@functools.lru_cache(maxsize=None)
+def load_stopwords(language):
+    """Read one language's stop-word list once per process"""
+    path = os.path.join(STOPWORDS_DIR, f"stop_{language}.txt")
+    with open(path, encoding="utf-8") as f:
+        return frozenset(f.read().lower().split())
+
+
+def get_stopwords(languages=DEFAULT_LANGUAGES, extra=None):
+    """Union of the given language lists and any user-supplied words"""
+    words = frozenset().union(*(load_stopwords(language) for language in languages))
+    if extra:
+        words = words | frozenset(w.lower() for w in extra)
+    return words
+
+
+def filter_counts(counts, stop_words):
+    """Drop stop words from a word -> count mapping.
+
+    Filtering the vocabulary instead of the token stream means one hash lookup
+    per distinct word, however many times it was used.
+    """
+    return Counter({w: c for w, c in counts.items() if w not in stop_words})
@@ -0,0 +1,34 @@
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import cube
+import synthetic_export
+
+
+@pytest.fixture(scope='session')
+def export():
+    """Bytes of a small synthetic chat export in 12h day-first format"""
+    out = io.StringIO()
+    synthetic_export.generate(out, 3000, users=6, seed=7)
+    return out.getvalue().encode('utf-8')
+
+
+@pytest.fixture
+def assert_cubes_equal():
+    """Check two cubes hold the same cells, in any order, and the same tables"""
+    def check(a, b):
+        keys = cube.CUBE_KEYS
+        pd.testing.assert_frame_equal(a['cells'].sort_values(keys).reset_index(drop=True),
+                                      b['cells'].sort_values(keys).reset_index(drop=True),
+                                      check_categorical=False)
+        for table in ('words', 'emojis', 'total_words', 'total_emojis'):
+            assert a[table] == b[table], table
+    return check
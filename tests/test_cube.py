@@ -0,0 +1,53 @@
+import io
+from datetime import datetime
+
+import chat_cache
+import cube
+import functions
+import synthetic_export
+
+
+def _processed(data):
+    return functions.PreProcess(functions.generateDataFrame(io.BytesIO(data)), True)
+
+
+def _messages(data):
+    """The export split into one bytes block per message"""
+    blocks = []
+    for line in data.splitlines(keepends=True):
+        if not blocks or functions._is_message_start(line, 0):
+            blocks.append(line)
+        else:
+            blocks[-1] += line
+    return blocks
+
+
+def test_merged_cubes_match_one_cube(export, assert_cubes_equal):
+    df = _processed(export)
+    bounds = [0, 700, 701, 1900, len(df)]
+    parts = [cube.buildCube(df.iloc[lo:hi]) for lo, hi in zip(bounds, bounds[1:])]
+    assert_cubes_equal(cube.mergeCubes(parts), cube.buildCube(df))
+
+
+def test_combine_counts_overlapping_exports_once(export, tmp_path, assert_cubes_equal):
+    blocks = _messages(export)
+    lo, hi = len(blocks) * 4 // 10, len(blocks) * 6 // 10
+    # An older export and a later one that starts partway through it
+    older = b"".join(blocks[:hi])
+    newer = blocks[0] + b"".join(blocks[lo:])
+    cache = chat_cache.ChatCache(cache_dir=str(tmp_path))
+    merged, duplicates = cache.combine({chat_cache.chat_id(d): io.BytesIO(d) for d in (older, newer)}, True)
+    assert duplicates == hi - lo + 1
+    assert_cubes_equal(merged, cube.buildCube(_processed(export)))
+
+
+def test_combine_keeps_messages_forwarded_to_another_chat(export, tmp_path, assert_cubes_equal):
+    out = io.StringIO()
+    synthetic_export.generate(out, 200, seed=99, start=datetime(2020, 6, 1))
+    # A few messages also sent, word for word and in the same minute, to an unrelated group
+    other = out.getvalue().encode('utf-8') + b"".join(_messages(export)[100:103])
+    cache = chat_cache.ChatCache(cache_dir=str(tmp_path))
+    merged, duplicates = cache.combine({chat_cache.chat_id(d): io.BytesIO(d) for d in (export, other)}, True)
+    assert duplicates == 0
+    assert_cubes_equal(merged, cube.mergeCubes([cube.buildCube(_processed(export)),
+                                                cube.buildCube(_processed(other))]))
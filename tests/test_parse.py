@@ -0,0 +1,38 @@
+import io
+
+import pandas as pd
+import pytest
+
+import functions
+
+
+def _parse(data, workers=None):
+    return functions.generateDataFrame(io.BytesIO(data), workers=workers)
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_parse_matches_serial(export, workers):
+    pd.testing.assert_frame_equal(_parse(export, workers), _parse(export, 1))
+
+
+BOM_EXPORT = ("\ufeff12/03/21, 10:00 - Alice: hi\n"
+              "12/03/21, 10:01 - Bob: hello\n"
+              "12/03/21, 10:02 - Bob: how are you\n").encode('utf-8')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_byte_order_mark_keeps_first_message(workers):
+    df = _parse(BOM_EXPORT, workers)
+    assert df['User'].tolist() == ['Alice', 'Bob', 'Bob']
+    assert df['Date'].tolist()[0] == '12/03/21'
+    assert df['Message'].tolist()[0] == 'hi '
+
+
+def test_byte_order_mark_split_across_reads():
+    lines = functions._iter_lines(io.BytesIO(BOM_EXPORT), chunk_size=2)
+    assert next(lines) == "12/03/21, 10:00 - Alice: hi "
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_byte_order_mark_matches_plain_export(export, workers):
+    pd.testing.assert_frame_equal(_parse(functions._BOM + export, workers), _parse(export))
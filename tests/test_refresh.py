@@ -0,0 +1,55 @@
+"""Refreshing a stored chat from a longer export must equal parsing that export afresh."""
+import io
+
+import pandas as pd
+
+import chat_cache
+import cube
+import functions
+
+
+def _prefix(data, fraction):
+    """The export cut at the first message start after fraction of its bytes"""
+    cut = int(len(data) * fraction)
+    while not functions._is_message_start(data, cut):
+        cut = functions._next_line(data, cut)
+    return data[:cut]
+
+
+def test_incremental_refresh_matches_full_rebuild(export, tmp_path, assert_cubes_equal):
+    cache = chat_cache.ChatCache(cache_dir=str(tmp_path))
+    old = _prefix(export, 0.8)
+    old_id, new_id = chat_cache.chat_id(old), chat_cache.chat_id(export)
+    cache.load_cube(old_id, io.BytesIO(old), True)
+    cache.clear()
+
+    raw = cache.load(new_id, io.BytesIO(export))
+    assert cache._find_parent(export) == (old_id, len(old))
+    full = functions.generateDataFrame(io.BytesIO(export))
+    pd.testing.assert_frame_equal(raw, full)
+    processed = functions.PreProcess(full, True)
+    pd.testing.assert_frame_equal(cache.load(new_id, None, True), processed)
+    assert_cubes_equal(cache.load_cube(new_id, None, True), cube.buildCube(processed))
+
+
+def test_refresh_reuses_parent_cube_under_a_tight_store_cap(export, tmp_path, monkeypatch, assert_cubes_equal):
+    # Every write evicts all other chats, so the parent must be read before any
+    cache = chat_cache.ChatCache(cache_dir=str(tmp_path), store_max_bytes=1)
+    old = _prefix(export, 0.8)
+    cache.load_cube(chat_cache.chat_id(old), io.BytesIO(old), True)
+
+    built = []
+    build = cube.buildCube
+
+    def counting_build(df, *args, **kwargs):
+        built.append(len(df))
+        return build(df, *args, **kwargs)
+
+    monkeypatch.setattr(cube, 'buildCube', counting_build)
+    new_id = chat_cache.chat_id(export)
+    cache.load(new_id, io.BytesIO(export))
+    refreshed = cache.load_cube(new_id, None, True)
+    processed = cache.load(new_id, None, True)
+    # Only the appended tail was aggregated
+    assert built and max(built) < len(processed) // 2
+    assert_cubes_equal(refreshed, build(processed))
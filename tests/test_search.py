@@ -0,0 +1,57 @@
+"""Indexed search must find exactly the rows a scan of every message finds."""
+import io
+import re
+
+import pytest
+
+import functions
+import search
+
+
+@pytest.fixture(scope='module')
+def chat(export):
+    df = functions.PreProcess(functions.generateDataFrame(io.BytesIO(export)), True)
+    return df, search.buildIndex(df)
+
+
+def _brute(df, matches, user=None, start=None, end=None):
+    """Rows found by tokenizing every message and testing it directly"""
+    skip = {functions.MEDIA_MESSAGE, functions.DELETED_MESSAGE}
+    rows = []
+    for row, (message, sender, when) in enumerate(zip(df['Message'], df['User'], df['timestamp'])):
+        tokens = [] if message in skip else re.findall(r'\w+', message.lower())
+        if (matches(tokens) and (user is None or sender == user)
+                and (start is None or when >= start) and (end is None or when < end)):
+            rows.append(row)
+    return rows
+
+
+def _has_phrase(tokens, phrase):
+    return any(tokens[i:i + len(phrase)] == phrase for i in range(len(tokens) - len(phrase) + 1))
+
+
+QUERIES = [
+    ('exam', lambda t: 'exam' in t),
+    ('exam notes', lambda t: 'exam' in t and 'notes' in t),
+    ('"meeting tomorrow"', lambda t: _has_phrase(t, ['meeting', 'tomorrow'])),
+    ('"tomorrow meeting"', lambda t: _has_phrase(t, ['tomorrow', 'meeting'])),
+    ('meet*', lambda t: any(x.startswith('meet') for x in t)),
+    ('"send please" th*', lambda t: _has_phrase(t, ['send', 'please']) and any(x.startswith('th') for x in t)),
+    ('zzznotaword', lambda t: False),
+    ('', lambda t: True),
+]
+
+
+@pytest.mark.parametrize('query,matches', QUERIES)
+def test_search_matches_scan(chat, query, matches):
+    df, index = chat
+    assert search.search(index, query).tolist() == _brute(df, matches)
+
+
+@pytest.mark.parametrize('query,matches', QUERIES)
+def test_search_filters_match_scan(chat, query, matches):
+    df, index = chat
+    user = sorted(index['user_names'])[1]
+    start, end = df['timestamp'].iloc[len(df) // 4], df['timestamp'].iloc[len(df) // 2]
+    assert (search.search(index, query, user=user, start=start, end=end).tolist()
+            == _brute(df, matches, user, start, end))